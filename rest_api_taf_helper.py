@@ -1,15 +1,23 @@
+import asyncio
+import logging
 import os
 from mcp.server.fastmcp import FastMCP
 from pydantic import Field
 from src.github_utils import read_nested_json_section
 from src.github_utils import read_text_file_contents
 from src.github_utils import get_service_schemas
+from src.github_utils import invalidate_cache as invalidate_github_cache
+from src.github_utils import prefetch_files
+from src.github_utils import GitHubFileReaderError
+from src.github_utils import SERVICE_CONTRACT_PATH_TEMPLATE
 from dotenv import load_dotenv
 from dataclasses import dataclass
 
 load_dotenv()
 
-@dataclass
+logger = logging.getLogger(__name__)
+
+@dataclass(slots=True)
 class AppContext:
     repository_owner: str
     repository_name: str
@@ -21,9 +29,85 @@ app_context: AppContext = AppContext(
         repository_name = os.environ.get("GITHUB_REPO_NAME"),
         service_name = '')
 
+# Step1 prompts longer than this are refused rather than returned, 0 (default) means no limit.
+# Memory is already bounded by GITHUB_MAX_FILE_BYTES; this only caps what is handed to the LLM client
+MAX_PROMPT_CHARS = int(os.environ.get("MAX_PROMPT_CHARS", 0))
+
+# Test framework layout, formatted with service name
+DTO_MODULE_PATH_TEMPLATE = "src/models/{}.model.ts"
+# Service which test framework template ships as an example for each layer
+EXAMPLE_SERVICE_NAME = "wizardWorld"
+EXAMPLE_CONTRACT_PATH = SERVICE_CONTRACT_PATH_TEMPLATE.format(EXAMPLE_SERVICE_NAME)
+EXAMPLE_DTO_MODULE_PATH = DTO_MODULE_PATH_TEMPLATE.format(EXAMPLE_SERVICE_NAME)
+
+# Prompt templates are built once at import and filled with str.format on each call.
+# Step1 keeps content shared by all services (instructions, examples) ahead of the service schema,
+# so the LLM client can reuse its prompt cache for that common prefix
+STEP0_PROMPT_TEMPLATE = """
+    Use 'configure_flow' tool of '{mcp_server_name}' MCP server to set configuration
+
+        repository_owner = {repository_owner}
+        repository_name = {repository_name}
+        service_name: {service_name}
+        
+    """
+
+STEP1_PROMPT_TEMPLATE = """
+    You are test automation engineer with expertise in REST API test automation, Swagger, TypeScript. 
+    Your task is to analyse OpenAPI/Swagger schema definition from <schema_for_analysis> section below, and generate TypeScript module with DTOs for each data class mentioned in the schema definition.
+    
+    Use example and guidelines below to generate Typescript module
+    <example_schema>
+    {example_schema}
+    </example_schema>
+
+    <example_dto_module>
+    {example_dto_module}
+    <example_dto_module>
+
+    <schema_for_analysis>
+    {schema}
+    </schema_for_analysis>
+
+    <guidelines>
+    1. Create a class with appropriate properties based on the schema
+    2. Use proper TypeScript types based on the schema types
+    3. Include JSDoc comments for properties using descriptions from the schema
+    4. Handle required vs optional properties correctly (use ? for optional properties)
+    5. Handle references to other schemas
+    6. Handle arrays, enums, and nested objects appropriately
+    7. Return ONLY the TypeScript code, nothing else
+    8. Return result to chat for user's review
+    9. Ask whether user would like to review and adjust module, or push changes to repository
+    10. For further push to repository, strictly follow steps: 
+        10.1. use 'github' tool, 
+        10.2. for repository '{owner}/{repo}, 
+        10.3. create branch dto_{service_name}, 
+        10.4. store prepared TypeScript module as {dto_module_path}
+        10.5. raise PR
+        10.6. inform user about result
+    </guidelines>
+        
+    """
+
 # Configure the MCP server with lifespan
 mcp = FastMCP(mcp_server_name)
 
+def missing_configuration(context: AppContext) -> list[str]:
+    """
+    Check flow configuration in a single pass
+    
+    Args:
+        context: configuration to check
+
+    Returns:
+        names of configuration values which are not set (empty or None), empty list if configuration is complete
+    """
+    return [name for name, value in (
+        ("Repository owner", context.repository_owner),
+        ("Repository name", context.repository_name),
+        ("Service name", context.service_name)) if not value]
+
 @mcp.resource("config://context")
 def get_config() -> str:
     """Repository owner, repository name, service name"""
@@ -49,14 +133,26 @@ def configure_flow(repository_owner: str, repository_name: str, service_name:str
     return f"MCP server works with context: {app_context}"   
 
 @mcp.tool()
-def generate_typescript_dto() -> str:
+def invalidate_cache() -> str:
+    """
+    Tool that drops cached GitHub file contents, so next requests read fresh files from repository
+    
+    Returns:
+        confirmation message    
+    """
+    invalidate_github_cache()
+
+    return "GitHub cache is cleared"
+
+@mcp.tool()
+async def generate_typescript_dto() -> str:
     """
     Tool that returns prompt for further execution, to generate TypeScript module with DTOs
     
     Returns:
         prompt for further run    
     """    
-    return run_step1_generate_typescript_dto()
+    return await run_step1_generate_typescript_dto()
 
 @mcp.prompt()
 def step0_configure_flow(
@@ -75,26 +171,23 @@ def step0_configure_flow(
         Prompt to process this request
     """
 
-    return f"""
-    Use 'configure_flow' tool of '{mcp_server_name}' MCP server to set configuration
-
-        repository_owner = {repository_owner}
-        repository_name = {repository_name}
-        service_name: {service_name}
-        
-    """
+    return STEP0_PROMPT_TEMPLATE.format(
+        mcp_server_name=mcp_server_name,
+        repository_owner=repository_owner,
+        repository_name=repository_name,
+        service_name=service_name)
 
 @mcp.prompt()
-def step1_generate_typescript_dto() -> str:
+async def step1_generate_typescript_dto() -> str:
     """
     Prompt to generate TypeScript module with DTOs for each data item used in service with service_name 
     
     Returns:
         Prompt to process this request
     """
-    return run_step1_generate_typescript_dto()
+    return await run_step1_generate_typescript_dto()
 
-def run_step1_generate_typescript_dto() -> str:
+async def run_step1_generate_typescript_dto() -> str:
     """
     Prompt to generate TypeScript module with DTOs for each data item used in service with service_name 
     
@@ -104,75 +197,54 @@ def run_step1_generate_typescript_dto() -> str:
     # Assumptions: 
     #     - test framework is built based on specific template, with approved structure
     #     - test framework already contains example for each layer of the test framework
+    missing = missing_configuration(app_context)
+    if missing:
+        verb = "is" if len(missing) == 1 else "are"
+        return f"Error: {', '.join(missing)} {verb} not defined. Use step0_configure_flow to configure flow."
+
     service_name = app_context.service_name
     owner = app_context.repository_owner
     repo = app_context.repository_name
-    if (repo == ""):
-        return "Error: Repository name is not defined. Use step0_configure_flow to configure flow."
-    if (owner == ""):
-        return "Error: Repository owner is not defined. Use step0_configure_flow to configure flow."
-    if (service_name == ""):
-        return "Error: Service name is not defined. Use step0_configure_flow to configure flow."
-
-    example_service_name = "wizardWorld"
-    path_to_exapmpe_contract = "serviceContracts/wizardWorld.json"
-    path_to_example_dto = "src/models/wizardWorld.model.ts"
 
-    schema = ''
-    example_schema = ''
+    contract_path = SERVICE_CONTRACT_PATH_TEMPLATE.format(service_name)
 
+    # Load all three files into the cache with one GitHub round-trip;
+    # reads below fetch anything that was not loaded file by file and report errors themselves
     try:
-        schema = get_service_schemas(owner, repo, service_name)
-    except Exception as e:
-        return f"Error reading serviceContracts/{service_name}.json: {str(e)}"  
+        await asyncio.to_thread(prefetch_files, owner, repo, [contract_path, EXAMPLE_CONTRACT_PATH, EXAMPLE_DTO_MODULE_PATH])
+    except GitHubFileReaderError as e:
+        logger.warning("GraphQL prefetch for %s/%s failed, files are read one by one: %s", owner, repo, e)
+
+    # Files are independent, so read them concurrently in worker threads
+    # to keep blocking GitHub calls off the event loop
+    schema, example_schema, example_dto_module = await asyncio.gather(
+        asyncio.to_thread(get_service_schemas, owner, repo, service_name),
+        asyncio.to_thread(read_nested_json_section, owner, repo, EXAMPLE_CONTRACT_PATH, ['components', 'schemas']),
+        asyncio.to_thread(read_text_file_contents, owner, repo, EXAMPLE_DTO_MODULE_PATH),
+        return_exceptions=True)
+
+    if isinstance(schema, Exception):
+        return f"Error reading {contract_path}: {str(schema)}"  
                      
-    try:
-        example_schema = read_nested_json_section(owner, repo,  path_to_exapmpe_contract, ['components', 'schemas'])
-    except Exception as e:
-        return f"Error reading {path_to_exapmpe_contract}: {str(e)}" 
+    if isinstance(example_schema, Exception):
+        return f"Error reading {EXAMPLE_CONTRACT_PATH}: {str(example_schema)}" 
 
-    try:
-        example_dto_module = read_text_file_contents(owner, repo,  path_to_example_dto)
-    except Exception as e:
-        return f"Error reading {path_to_example_dto}: {str(e)}"     
+    if isinstance(example_dto_module, Exception):
+        return f"Error reading {EXAMPLE_DTO_MODULE_PATH}: {str(example_dto_module)}"     
 
-    return f"""
-    You are test automation engineer with expertise in REST API test automation, Swagger, TypeScript. 
-    Your task is to analyse the following OpenAPI/Swagger schema definition, and generate TypeScript module with DTOs for each data class mentioned in the schema definition.
-    
-    <schema_for_analysis>
-    {schema}
-    </schema_for_analysis>
-    
-    Use example and guidelines below to generate Typescript module
-    <example_schema>
-    {example_schema}
-    </example_schema>
+    prompt = STEP1_PROMPT_TEMPLATE.format(
+        schema=schema,
+        example_schema=example_schema,
+        example_dto_module=example_dto_module,
+        owner=owner,
+        repo=repo,
+        service_name=service_name,
+        dto_module_path=DTO_MODULE_PATH_TEMPLATE.format(service_name))
 
-    <example_dto_module>
-    {example_dto_module}
-    <example_dto_module>
+    if MAX_PROMPT_CHARS and len(prompt) > MAX_PROMPT_CHARS:
+        return f"Error: prompt for {contract_path} is too large ({len(prompt)} characters, limit is {MAX_PROMPT_CHARS}). Increase MAX_PROMPT_CHARS or split the contract."
 
-    <guidelines>
-    1. Create a class with appropriate properties based on the schema
-    2. Use proper TypeScript types based on the schema types
-    3. Include JSDoc comments for properties using descriptions from the schema
-    4. Handle required vs optional properties correctly (use ? for optional properties)
-    5. Handle references to other schemas
-    6. Handle arrays, enums, and nested objects appropriately
-    7. Return ONLY the TypeScript code, nothing else
-    8. Return result to chat for user's review
-    9. Ask whether user would like to review and adjust module, or push changes to repository
-    10. For further push to repository, strictly follow steps: 
-        10.1. use 'github' tool, 
-        10.2. for repository '{owner}/{repo}, 
-        10.3. create branch dto_{service_name}, 
-        10.4. store prepared TypeScript module as src/models/{service_name}.model.ts
-        10.5. raise PR
-        10.6. inform user about result
-    </guidelines>
-        
-    """
+    return prompt
 
 
 if __name__ == "__main__":
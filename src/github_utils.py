@@ -1,23 +1,242 @@
-import base64
-from github import Github
-import json
+import httpx
+import orjson
 from typing import Union, Dict, Any
 from dotenv import load_dotenv
+from collections import OrderedDict
+from functools import lru_cache, reduce
+import operator
 import os
+import threading
+import time
+from urllib.parse import quote
 
 load_dotenv()
 
+GITHUB_API_URL = "https://api.github.com"
+
+# Files bigger than this are refused before they are downloaded in full or parsed
+MAX_FILE_BYTES = int(os.environ.get("GITHUB_MAX_FILE_BYTES", 10 * 1024 * 1024))
+
+# Cached files are served without asking GitHub again for this many seconds
+FILE_CACHE_TTL_SECONDS = float(os.environ.get("GITHUB_CACHE_TTL_SECONDS", 300))
+FILE_CACHE_MAX_ENTRIES = 128
+# Least recently used files are evicted once cached contents exceed this size in total
+FILE_CACHE_MAX_BYTES = int(os.environ.get("GITHUB_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+
+# Location of service contract in test framework repository, formatted with service name
+SERVICE_CONTRACT_PATH_TEMPLATE = "serviceContracts/{}.json"
+
+_github_client = None
+_github_client_lock = threading.Lock()
+
+# (owner, repo, file_path) -> (fetched at, ETag, contents), least recently used first
+_file_cache: OrderedDict[tuple[str, str, str], tuple[float, str | None, bytes]] = OrderedDict()
+_file_cache_bytes = 0
+_file_cache_lock = threading.Lock()
+
 class GitHubJsonReaderError(Exception):
-    def __init__(self, message):
-        super().__init__(message)
+    pass
 
 class JsonSectionNotFoundError(Exception):
-    def __init__(self, message):
-        super().__init__(message)
+    pass
 
 class GitHubFileReaderError(Exception):
-    def __init__(self, message):
-        super().__init__(message)                  
+    pass
+
+class GitHubFileTooLargeError(Exception):
+    pass
+
+def get_github_client() -> httpx.Client:
+    """
+    Return the GitHub REST API client shared by the whole process.
+    The client is created on first use, so every helper call reuses the same
+    authenticated session and its pooled keep-alive connections.
+    :return: Shared HTTP client bound to GitHub REST API
+    :raises ValueError: If GitHub token is not set
+    """
+    global _github_client
+    with _github_client_lock:
+        if _github_client is None:
+            # Use GitHub token from environment variable
+            github_token = os.environ.get("GITHUB_TOKEN")
+            if not github_token:
+                raise ValueError("GitHub token not found in environment variables")
+            _github_client = httpx.Client(
+                base_url=GITHUB_API_URL,
+                headers={
+                    "Authorization": f"Bearer {github_token}",
+                    "X-GitHub-Api-Version": "2022-11-28"},
+                limits=httpx.Limits(max_connections=32, max_keepalive_connections=16),
+                timeout=httpx.Timeout(30.0, connect=5.0),
+                # GitHub answers for renamed or transferred repositories with a redirect
+                follow_redirects=True)
+        return _github_client
+
+def _fetch_file(owner: str, repo: str, file_path: str) -> bytes:
+    """
+    Fetch raw contents of a file from a GitHub repository, using the file cache.
+    Results are cached per (owner, repo, file_path) for FILE_CACHE_TTL_SECONDS, up to
+    FILE_CACHE_MAX_ENTRIES files and FILE_CACHE_MAX_BYTES in total; use invalidate_cache() to force fresh reads.
+    Expired files are revalidated with their ETag, so unchanged files are not downloaded again.
+    :param owner: Repository owner's username
+    :param repo: Repository name
+    :param file_path: Path to the file in the repository
+    :return: File contents as bytes
+    """
+    key = (owner, repo, file_path)
+    with _file_cache_lock:
+        cached = _file_cache.get(key)
+        if cached is not None and time.monotonic() - cached[0] < FILE_CACHE_TTL_SECONDS:
+            _file_cache.move_to_end(key)
+            return cached[2]
+
+    downloaded = _download_file(owner, repo, file_path, cached[1] if cached is not None else None)
+    # Nothing downloaded means GitHub confirmed that cached contents are still current
+    etag, content = downloaded if downloaded is not None else cached[1:]
+    _cache_file(key, content, etag)
+
+    return content
+
+def _cache_file(key: tuple[str, str, str], content: bytes, etag: str | None = None) -> None:
+    """
+    Store file contents in the file cache, evicting least recently used files over the limits.
+    The file just stored is kept even if it alone exceeds FILE_CACHE_MAX_BYTES.
+    :param key: (owner, repo, file_path) of the file
+    :param content: File contents as bytes
+    :param etag: ETag of the contents to revalidate them with, if known
+    """
+    global _file_cache_bytes
+    with _file_cache_lock:
+        replaced = _file_cache.pop(key, None)
+        if replaced is not None:
+            _file_cache_bytes -= len(replaced[2])
+        _file_cache[key] = (time.monotonic(), etag, content)
+        _file_cache_bytes += len(content)
+        while len(_file_cache) > 1 and (
+                len(_file_cache) > FILE_CACHE_MAX_ENTRIES or _file_cache_bytes > FILE_CACHE_MAX_BYTES):
+            _, (_, _, evicted) = _file_cache.popitem(last=False)
+            _file_cache_bytes -= len(evicted)
+
+def _download_file(owner: str, repo: str, file_path: str, etag: str | None = None) -> tuple[str | None, bytes] | None:
+    """
+    Download raw contents of a file from a GitHub repository.
+    The raw media type makes GitHub return the file body itself in a single request,
+    with no repository lookup, JSON wrapper or base64 encoding.
+    With an ETag the request is conditional: unchanged file costs a 304 response with no body.
+    :param owner: Repository owner's username
+    :param repo: Repository name
+    :param file_path: Path to the file in the repository
+    :param etag: ETag of previously downloaded contents, if any
+    :return: ETag and file contents as bytes, None if file has not changed since etag
+    :raises GitHubFileTooLargeError: If file is bigger than MAX_FILE_BYTES
+    """
+    headers = {"Accept": "application/vnd.github.raw+json"}
+    if etag:
+        headers["If-None-Match"] = etag
+
+    with get_github_client().stream(
+        "GET",
+        f"/repos/{quote(owner, safe='')}/{quote(repo, safe='')}/contents/{quote(file_path)}",
+        headers=headers) as response:
+        if etag and response.status_code == httpx.codes.NOT_MODIFIED:
+            return None
+        response.raise_for_status()
+
+        return response.headers.get("ETag"), _read_limited(response, MAX_FILE_BYTES)
+
+def _read_limited(response: httpx.Response, limit: int) -> bytes:
+    """
+    Read body of a streamed response, refusing it as soon as it is known to exceed the limit.
+    :param response: Response opened with stream()
+    :param limit: Maximum body size in bytes
+    :return: Response body as bytes
+    :raises GitHubFileTooLargeError: If body is bigger than limit
+    """
+    # Fail fast on declared size, and keep counting for responses without Content-Length
+    content_length = int(response.headers.get("Content-Length", 0))
+    if content_length > limit:
+        raise GitHubFileTooLargeError(f"File is too large: {content_length} bytes, limit is {limit} bytes")
+
+    chunks = []
+    size = 0
+    for chunk in response.iter_bytes():
+        size += len(chunk)
+        if size > limit:
+            raise GitHubFileTooLargeError(f"File is too large: more than {limit} bytes")
+        chunks.append(chunk)
+
+    return b"".join(chunks)
+
+def prefetch_files(owner: str, repo: str, file_paths: list[str]) -> None:
+    """
+    Load several files of a repository into the file cache with a single GitHub GraphQL request,
+    instead of one REST request per file.
+    Files which are cached are not requested, even if they expired: regular reads revalidate them
+    with a conditional REST request, which also stores their ETag. Files GraphQL cannot return in full
+    (missing, binary, truncated or bigger than MAX_FILE_BYTES) are not cached, so regular reads
+    fetch them one by one and report their own errors.
+    GraphQL returns all files in one JSON response, so MAX_FILE_BYTES cannot be checked per file
+    before download; instead the whole response is streamed under a limit of twice MAX_FILE_BYTES
+    per requested file (JSON string escaping can double file size).
+    :param owner: Repository owner's username
+    :param repo: Repository name
+    :param file_paths: Paths to the files in the repository, read from default branch
+    :raises GitHubFileReaderError: If GraphQL request fails, its response is bigger than its limit,
+                                   is not valid JSON or reports errors instead of data
+    """
+    with _file_cache_lock:
+        file_paths = [
+            file_path for file_path in dict.fromkeys(file_paths)
+            if (owner, repo, file_path) not in _file_cache]
+
+    # A single file is as cheap to read with REST
+    if len(file_paths) < 2:
+        return
+
+    # File paths go through variables, one aliased object lookup per file
+    variables = {"owner": owner, "name": repo}
+    declarations = []
+    lookups = []
+    for index, file_path in enumerate(file_paths):
+        variables[f"e{index}"] = f"HEAD:{file_path}"
+        declarations.append(f"$e{index}: String!")
+        lookups.append(f"f{index}: object(expression: $e{index}) {{ ... on Blob {{ text byteSize isBinary isTruncated }} }}")
+    query = (
+        f"query($owner: String!, $name: String!, {', '.join(declarations)}) {{ "
+        f"repository(owner: $owner, name: $name) {{ {' '.join(lookups)} }} }}")
+
+    try:
+        with get_github_client().stream(
+            "POST", "/graphql", json={"query": query, "variables": variables}) as response:
+            response.raise_for_status()
+            payload = orjson.loads(_read_limited(response, 2 * MAX_FILE_BYTES * len(file_paths)))
+
+        if not isinstance(payload, dict):
+            raise ValueError(f"GraphQL response is not a JSON object: {type(payload).__name__}")
+        repository = (payload.get("data") or {}).get("repository")
+        if repository is None:
+            raise ValueError(f"GraphQL request returned no repository data: {payload.get('errors')}")
+
+        for index, file_path in enumerate(file_paths):
+            blob = repository.get(f"f{index}") or {}
+            text = blob.get("text")
+            if (text is None or blob.get("isBinary") or blob.get("isTruncated")
+                    or blob.get("byteSize", 0) > MAX_FILE_BYTES):
+                continue
+            _cache_file((owner, repo, file_path), text.encode('utf-8'))
+
+    except Exception as e:
+        raise GitHubFileReaderError(f"Error prefetching files: {e}. file paths {file_paths}")
+
+def invalidate_cache() -> None:
+    """
+    Drop all cached GitHub file contents, so next reads go to GitHub again.
+    """
+    global _file_cache_bytes
+    with _file_cache_lock:
+        _file_cache.clear()
+        _file_cache_bytes = 0
+    _parse_json.cache_clear()
 
 def read_nested_json_section(
     owner: str, 
@@ -27,6 +246,9 @@ def read_nested_json_section(
 ) -> Union[Dict[str, Any], Any, None]:
     """
     Read a nested section from a JSON file in a GitHub repository.
+    Parsed files are cached and shared between reads, so the returned section is shared too:
+    callers must not modify it, or must modify a copy (e.g. copy.deepcopy), as changes would show up
+    in later reads of the same file.
     :param owner: Repository owner's username
     :param repo: Repository name
     :param file_path: Path to the JSON file in the repository
@@ -34,58 +256,70 @@ def read_nested_json_section(
                          E.g., ['components', 'schemas'] to get the 'schemas' section
     :return: Requested nested section of the JSON
     """
-    # Use GitHub token from environment variable
-    github_token = os.environ.get("GITHUB_TOKEN")
-    if not github_token:
-        raise ValueError("GitHub token not found in environment variables")
-
     try:
-        with Github(github_token) as g:
-            
-            # Get the repository
-            repository = g.get_repo(f"{owner}/{repo}")
-            
-            # Get the file contents
-            file_contents = repository.get_contents(file_path)
-            
-            # Decode the file content
-            file_content_decoded = base64.b64decode(file_contents.content).decode('utf-8')
-            
-            # Parse the JSON
-            json_data = json.loads(file_content_decoded)
-            
-            # Navigate through nested sections
-            current_section = json_data
-            for key in section_path:
-                if isinstance(current_section, dict):
-                    current_section = current_section.get(key)
-                else:
-                    raise JsonSectionNotFoundError(f"Cannot navigate to {key}. Current section is not a dictionary. section path {section_path}, file path {file_path}")
-                
-                if current_section is None:
-                    raise JsonSectionNotFoundError(f"Section '{key}' not found. section path {section_path}, file path {file_path}")
-            
-            return current_section
+        # Get the file contents and the section parsed from them
+        return _parse_json_section(_fetch_file(owner, repo, file_path), tuple(section_path))
     
     except Exception as e:
         raise GitHubJsonReaderError(f"An error occurred: {e}. section path {section_path}, file path {file_path}")
 
+# Step1 reads two JSON files (service contract and example contract), so a few parsed
+# documents are enough, while each one can take several times its file size in memory
+@lru_cache(maxsize=4)
+def _parse_json(file_content: bytes) -> Any:
+    """
+    Parse JSON file contents straight from bytes.
+    Results are cached per file contents: files served from the file cache (e.g. example contract,
+    which is read for every service) are parsed only once, several sections read from the same file
+    (e.g. components/schemas, then definitions of a service contract) share one parse,
+    and changed files miss the cache because their contents differ.
+    Returned document is shared between callers and must not be modified.
+    :param file_content: JSON file contents as bytes
+    :return: Parsed JSON document
+    """
+    return orjson.loads(file_content)
+
+def _parse_json_section(file_content: bytes, section_path: tuple[str, ...]) -> Any:
+    """
+    Parse a nested section from JSON file contents.
+    Returned section is shared between callers and must not be modified.
+    :param file_content: JSON file contents as bytes
+    :param section_path: Nested keys to navigate to the desired section
+    :return: Requested nested section of the JSON
+    :raises JsonSectionNotFoundError: If section is missing or empty
+    """
+    json_data = _parse_json(file_content)
+    
+    # Navigate through nested sections: a missing key raises KeyError,
+    # a value which is not an object raises TypeError
+    try:
+        current_section = reduce(operator.getitem, section_path, json_data)
+    except (KeyError, TypeError) as e:
+        raise JsonSectionNotFoundError(f"Section not found: {e!r}") from e
+
+    if current_section is None:
+        raise JsonSectionNotFoundError("Section is empty")
+    
+    return current_section
+
 def get_service_schemas(owner, repo, service_name):
+    # Returned schemas come from read_nested_json_section and are shared, so they must not be modified
     schema1 = ''
     schema2 = ''
     error1 = ''
     error2 = ''
+    contract_path = SERVICE_CONTRACT_PATH_TEMPLATE.format(service_name)
 
     try:
-        schema1 = read_nested_json_section(owner, repo, f"serviceContracts/{service_name}.json", ['components', 'schemas'])
+        schema1 = read_nested_json_section(owner, repo, contract_path, ['components', 'schemas'])
     except Exception as e:
-        error1 = f"Error reading serviceContracts/{service_name}.json (components/schemas): {str(e)}"  
+        error1 = f"Error reading {contract_path} (components/schemas): {str(e)}"  
     
     if not schema1:
         try:
-            schema2 = read_nested_json_section(owner, repo, f"serviceContracts/{service_name}.json", ['definitions'])
+            schema2 = read_nested_json_section(owner, repo, contract_path, ['definitions'])
         except Exception as e:
-            error2 = f"Error reading serviceContracts/{service_name}.json (definitions): {str(e)}"    
+            error2 = f"Error reading {contract_path} (definitions): {str(e)}"    
     
     if not schema1 and not schema2:
         raise  GitHubJsonReaderError(f"Errors: {error1}, {error2}")
@@ -106,19 +340,8 @@ def read_text_file_contents(
     :return: Full contents of the text file as a string
     :raises GitHubFileReaderError: If there are issues reading the file
     """
-    # Use GitHub token from environment variable
-    github_token = os.environ.get("GITHUB_TOKEN")
-    if not github_token:
-        raise ValueError("GitHub token not found in environment variables")
-
     try:
-        # Use context manager for GitHub client
-        with Github(github_token) as g:
-            repository = g.get_repo(f"{owner}/{repo}")
-            file_contents = repository.get_contents(file_path)
-            file_content_decoded = base64.b64decode(file_contents.content).decode('utf-8')
-          
-            return file_content_decoded
+        return _fetch_file(owner, repo, file_path).decode('utf-8')
     
     except Exception as e:
         raise GitHubFileReaderError(f"Error reading file: {e}. file path {file_path}")